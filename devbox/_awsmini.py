@@ -0,0 +1,365 @@
+"""Minimal Amazon EC2 Query API Client
+
+Signs requests with AWS Signature Version 4 and implements only the EC2
+operations devbox uses, returning dictionaries shaped like Boto3's so it can
+stand in for a Boto3 EC2 client without importing boto3 and botocore.
+"""
+import configparser
+import datetime
+import hashlib
+import hmac
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ElementTree
+
+API_VERSION = "2016-11-15"
+SERVICE = "ec2"
+TIMEOUT = 10
+
+# Profile settings that need credential sources only Boto3 implements.
+_UNSUPPORTED_PROFILE_KEYS = (
+    "role_arn",
+    "credential_process",
+    "credential_source",
+    "sso_start_url",
+    "sso_session",
+    "web_identity_token_file",
+)
+
+
+class ClientError(Exception):
+    """An error response from the EC2 API, shaped like botocore's ClientError."""
+
+    def __init__(self, code: str, message: str, operation_name: str):
+        self.response = {"Error": {"Code": code, "Message": message}}
+        self.operation_name = operation_name
+        super().__init__(
+            f"An error occurred ({code}) when calling the {operation_name} "
+            f"operation: {message}"
+        )
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sigv4_sign(method, url, headers, body, region, access_key, secret_key,
+               session_token=None, service=SERVICE, now=None):
+    """
+    Signs a request with AWS Signature Version 4.
+    :param headers: The request headers. They are updated in place with the
+                    X-Amz-Date, X-Amz-Security-Token and Authorization headers.
+    :param body: The request body as bytes.
+    :return: The signed headers.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date_stamp = now.strftime("%Y%m%d")
+    parts = urllib.parse.urlsplit(url)
+    headers["Host"] = parts.netloc
+    headers["X-Amz-Date"] = amz_date
+    if session_token:
+        headers["X-Amz-Security-Token"] = session_token
+
+    canonical_headers = sorted(
+        (name.lower(), " ".join(str(value).split())) for name, value in headers.items()
+    )
+    signed_headers = ";".join(name for name, _ in canonical_headers)
+    query = sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True))
+    canonical_request = "\n".join([
+        method,
+        urllib.parse.quote(parts.path or "/", safe="/-_.~"),
+        urllib.parse.urlencode(query, quote_via=urllib.parse.quote),
+        "".join(f"{name}:{value}\n" for name, value in canonical_headers),
+        signed_headers,
+        _sha256(body),
+    ])
+    scope = f"{date_stamp}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256",
+        amz_date,
+        scope,
+        _sha256(canonical_request.encode("utf-8")),
+    ])
+    signing_key = _hmac(("AWS4" + secret_key).encode("utf-8"), date_stamp)
+    for part in (region, service, "aws4_request"):
+        signing_key = _hmac(signing_key, part)
+    signature = hmac.new(
+        signing_key, string_to_sign.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+    headers["Authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+        f"SignedHeaders={signed_headers}, Signature={signature}"
+    )
+    return headers
+
+
+def _read_profile(path, section):
+    """Returns the settings of `section` in the INI file at `path`."""
+    parser = configparser.RawConfigParser()
+    try:
+        parser.read(os.path.expanduser(path))
+    except configparser.Error:
+        return {}
+    if not parser.has_section(section):
+        return {}
+    return dict(parser.items(section))
+
+
+def load_settings():
+    """
+    Reads static credentials and the region from the environment and the
+    shared AWS credentials and config files.
+    :return: A dictionary with `access_key`, `secret_key`, `session_token`
+             and `region`, or None if the profile needs Boto3 to resolve.
+    """
+    profile = os.environ.get("AWS_PROFILE") or os.environ.get("AWS_DEFAULT_PROFILE") or "default"
+    config = _read_profile(
+        os.environ.get("AWS_CONFIG_FILE", "~/.aws/config"),
+        "default" if profile == "default" else f"profile {profile}",
+    )
+    if any(key in config for key in _UNSUPPORTED_PROFILE_KEYS):
+        return None
+    region = os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION") or config.get("region")
+
+    access_key = os.environ.get("AWS_ACCESS_KEY_ID")
+    secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
+    session_token = os.environ.get("AWS_SESSION_TOKEN")
+    if not (access_key and secret_key):
+        credentials = _read_profile(
+            os.environ.get("AWS_SHARED_CREDENTIALS_FILE", "~/.aws/credentials"), profile
+        )
+        access_key = credentials.get("aws_access_key_id") or config.get("aws_access_key_id")
+        secret_key = credentials.get("aws_secret_access_key") or config.get("aws_secret_access_key")
+        session_token = credentials.get("aws_session_token") or config.get("aws_session_token")
+    if not (access_key and secret_key and region):
+        return None
+    return {
+        "access_key": access_key,
+        "secret_key": secret_key,
+        "session_token": session_token,
+        "region": region,
+    }
+
+
+def _flatten(params, prefix, value):
+    """Flattens `value` into EC2 Query API parameters under `prefix`."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(params, f"{prefix}.{key}" if prefix else key, item)
+    elif isinstance(value, (list, tuple)):
+        for index, item in enumerate(value, start=1):
+            _flatten(params, f"{prefix}.{index}", item)
+    else:
+        params[prefix] = str(value)
+
+
+def _strip_namespaces(root):
+    for element in root.iter():
+        element.tag = element.tag.rpartition("}")[2]
+    return root
+
+
+def _items(element, path):
+    """Returns the `item` children of the list at `path`."""
+    parent = element.find(path)
+    return [] if parent is None else parent.findall("item")
+
+
+def _tags(element):
+    return [
+        {"Key": item.findtext("key"), "Value": item.findtext("value") or ""}
+        for item in _items(element, "tagSet")
+    ]
+
+
+def _parse_instance(element):
+    instance = {
+        "InstanceId": element.findtext("instanceId"),
+        "State": {
+            "Code": int(element.findtext("instanceState/code") or 0),
+            "Name": element.findtext("instanceState/name"),
+        },
+        "SecurityGroups": [
+            {"GroupId": item.findtext("groupId"), "GroupName": item.findtext("groupName")}
+            for item in _items(element, "groupSet")
+        ],
+        "Tags": _tags(element),
+    }
+    if element.findtext("ipAddress"):
+        instance["PublicIpAddress"] = element.findtext("ipAddress")
+    return instance
+
+
+def _parse_describe_instances(root):
+    response = {
+        "Reservations": [
+            {
+                "ReservationId": reservation.findtext("reservationId"),
+                "Instances": [
+                    _parse_instance(item) for item in _items(reservation, "instancesSet")
+                ],
+            }
+            for reservation in _items(root, "reservationSet")
+        ]
+    }
+    if root.findtext("nextToken"):
+        response["NextToken"] = root.findtext("nextToken")
+    return response
+
+
+def _parse_ip_permission(element):
+    permission = {
+        "IpProtocol": element.findtext("ipProtocol"),
+        "IpRanges": [
+            {"CidrIp": item.findtext("cidrIp")} for item in _items(element, "ipRanges")
+        ],
+    }
+    for key, tag in (("FromPort", "fromPort"), ("ToPort", "toPort")):
+        if element.findtext(tag):
+            permission[key] = int(element.findtext(tag))
+    return permission
+
+
+def _parse_describe_security_groups(root):
+    return {
+        "SecurityGroups": [
+            {
+                "GroupId": item.findtext("groupId"),
+                "GroupName": item.findtext("groupName"),
+                "IpPermissions": [
+                    _parse_ip_permission(permission)
+                    for permission in _items(item, "ipPermissions")
+                ],
+            }
+            for item in _items(root, "securityGroupInfo")
+        ]
+    }
+
+
+def _parse_return(root):
+    return {"Return": root.findtext("return") == "true"}
+
+
+class DescribeInstancesPaginator:
+    """Pages through describe_instances results using NextToken."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def paginate(self, PaginationConfig=None, **kwargs):
+        config = PaginationConfig or {}
+        max_items = config.get("MaxItems")
+        if config.get("PageSize"):
+            kwargs["MaxResults"] = config["PageSize"]
+        if config.get("StartingToken"):
+            kwargs["NextToken"] = config["StartingToken"]
+        seen = 0
+        while True:
+            page = self._client.describe_instances(**kwargs)
+            if max_items is not None:
+                page["Reservations"] = page["Reservations"][:max_items - seen]
+                seen += len(page["Reservations"])
+            yield page
+            if "NextToken" not in page or (max_items is not None and seen >= max_items):
+                return
+            kwargs["NextToken"] = page["NextToken"]
+
+
+class Client:
+    """A minimal EC2 client exposing the Boto3 client methods devbox uses."""
+
+    def __init__(self, access_key, secret_key, region, session_token=None):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.session_token = session_token
+        self.region = region
+        domain = "amazonaws.com.cn" if region.startswith("cn-") else "amazonaws.com"
+        self.endpoint = os.environ.get(
+            "AWS_ENDPOINT_URL_EC2", f"https://ec2.{region}.{domain}/"
+        )
+
+    @classmethod
+    def from_environment(cls):
+        """
+        :return: A client using the configured static credentials, or None if
+                 there are none.
+        """
+        settings = load_settings()
+        if settings is None:
+            return None
+        return cls(**settings)
+
+    def call(self, action, params):
+        """
+        Calls an EC2 Query API action.
+        :param params: Boto3-style request parameters, flattened for the Query API.
+        :return: The parsed XML response with namespaces stripped.
+        """
+        query = {"Action": action, "Version": API_VERSION}
+        _flatten(query, "", params)
+        body = urllib.parse.urlencode(query).encode("utf-8")
+        headers = sigv4_sign(
+            "POST",
+            self.endpoint,
+            {"Content-Type": "application/x-www-form-urlencoded; charset=utf-8"},
+            body,
+            self.region,
+            self.access_key,
+            self.secret_key,
+            self.session_token,
+        )
+        request = urllib.request.Request(self.endpoint, data=body, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+                return _strip_namespaces(ElementTree.fromstring(response.read()))
+        except urllib.error.HTTPError as e:
+            payload = e.read()
+            try:
+                root = _strip_namespaces(ElementTree.fromstring(payload))
+            except ElementTree.ParseError:
+                raise ClientError(str(e.code), payload.decode("utf-8", "replace"), action) from None
+            raise ClientError(
+                root.findtext(".//Error/Code") or str(e.code),
+                root.findtext(".//Error/Message") or "",
+                action,
+            ) from None
+
+    def describe_instances(self, InstanceIds=(), Filters=(), **kwargs):
+        filters = [{"Name": f["Name"], "Value": list(f["Values"])} for f in Filters]
+        params = {"InstanceId": list(InstanceIds), "Filter": filters, **kwargs}
+        return _parse_describe_instances(self.call("DescribeInstances", params))
+
+    def start_instances(self, InstanceIds):
+        self.call("StartInstances", {"InstanceId": list(InstanceIds)})
+        return {}
+
+    def stop_instances(self, InstanceIds):
+        self.call("StopInstances", {"InstanceId": list(InstanceIds)})
+        return {}
+
+    def reboot_instances(self, InstanceIds):
+        self.call("RebootInstances", {"InstanceId": list(InstanceIds)})
+        return {}
+
+    def describe_security_groups(self, GroupIds=()):
+        root = self.call("DescribeSecurityGroups", {"GroupId": list(GroupIds)})
+        return _parse_describe_security_groups(root)
+
+    def authorize_security_group_ingress(self, GroupId, IpPermissions):
+        root = self.call(
+            "AuthorizeSecurityGroupIngress",
+            {"GroupId": GroupId, "IpPermissions": list(IpPermissions)},
+        )
+        return _parse_return(root)
+
+    def get_paginator(self, operation_name):
+        if operation_name != "describe_instances":
+            raise ValueError(f"No paginator for {operation_name}")
+        return DescribeInstancesPaginator(self)
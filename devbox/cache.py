@@ -0,0 +1,60 @@
+"""Local Cache Files"""
+import functools
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=1)
+def cache_dir() -> str:
+    """
+    :return: The per-user cache directory of devbox.
+    """
+    import platformdirs
+
+    return platformdirs.user_cache_dir("devbox")
+
+
+def cache_path(name: str) -> str:
+    """
+    :param name: The name of the cache file.
+    :return: The path of the cache file.
+    """
+    return os.path.join(cache_dir(), name)
+
+
+def read_json(name: str) -> dict:
+    """
+    :param name: The name of the cache file.
+    :return: The cached dictionary, or an empty one if it is missing or corrupt.
+    """
+    try:
+        with open(cache_path(name)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def write_json(name: str, data: dict):
+    """
+    Atomically replaces the cache file with `data`, so concurrent devbox
+    processes never read a partial file. Failures are logged and ignored
+    since the cache is only an optimization.
+    """
+    path = cache_path(name)
+    tmp = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.debug(f"Error writing cache file {name}: {str(e)}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
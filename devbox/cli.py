@@ -1,48 +1,184 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Optional
+import logging
+import os
+import time
+from typing import Any, Callable, List, Optional, Tuple
 import typer
-from devbox import __app_name__, __version__, ec2
+from devbox import __app_name__, __version__, cache
 app = typer.Typer()
-from requests import get
+
+IP_CACHE = "ip.json"
+IP_CACHE_TTL = 60
+IMDS_URL = "http://169.254.169.254/latest"
+
+
+def _imds_public_ip(timeout: float = 0.2) -> str:
+    """Gets this host's public IP from the EC2 instance metadata service (IMDSv2)."""
+    import urllib.request
+
+    # Never send metadata requests through a proxy
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+    token_request = urllib.request.Request(
+        f"{IMDS_URL}/api/token",
+        method="PUT",
+        headers={"X-aws-ec2-metadata-token-ttl-seconds": "60"})
+    with opener.open(token_request, timeout=timeout) as response:
+        token = response.read().decode('utf8')
+    ip_request = urllib.request.Request(
+        f"{IMDS_URL}/meta-data/public-ipv4",
+        headers={"X-aws-ec2-metadata-token": token})
+    with opener.open(ip_request, timeout=timeout) as response:
+        return response.read().decode('utf8').strip()
+
+
+def _local_egress_ip() -> str:
+    """
+    Gets the IP address of the local interface used to reach the internet.
+    Connecting a UDP socket sends no packets, it only selects a route.
+    """
+    import socket
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.setblocking(False)
+        s.connect(("1.1.1.1", 80))
+        return s.getsockname()[0]
+
+
+def _my_public_ip() -> str:
+    """
+    Gets my public IP address, trying in order a recent cached value,
+    the EC2 instance metadata service and finally ipify.
+    With DEVBOX_LOCAL_IP=1 the local egress (e.g. LAN or VPN) IP is used instead.
+    """
+    if os.environ.get("DEVBOX_LOCAL_IP") == "1":
+        return _local_egress_ip()
+    cached = cache.read_json(IP_CACHE)
+    if cached.get("ip") and time.time() - cached.get("updated", 0) < IP_CACHE_TTL:
+        return cached["ip"]
+    try:
+        ip = _imds_public_ip()
+    except OSError:
+        import urllib.request
+
+        with urllib.request.urlopen('https://api.ipify.org', timeout=3) as response:
+            ip = response.read().decode('utf8')
+    cache.write_json(IP_CACHE, {"ip": ip, "updated": time.time()})
+    return ip
+
+
+def _split_names(instance_names: str) -> List[str]:
+    """Splits a comma-separated list of instance names."""
+    return [name.strip() for name in instance_names.split(",") if name.strip()]
+
+
+def _map_concurrently(function: Callable, items: List) -> List[Tuple[Any, Optional[Exception]]]:
+    """
+    Calls `function` on each item in its own thread, preserving order.
+    A failing item does not stop the others: each item yields a
+    (result, None) or (None, exception) pair.
+    """
+    def call(item):
+        try:
+            return function(item), None
+        except Exception as e:
+            return None, e
+
+    if len(items) <= 1:
+        return [call(item) for item in items]
+    with ThreadPoolExecutor(max_workers=len(items)) as executor:
+        return list(executor.map(call, items))
+
+
+def _echo_outcomes(names: List[str], outcomes: List, action: str, describe: Callable) -> None:
+    """
+    Echoes the outcome for every instance, then exits non-zero if any failed.
+    A None result, or a tuple starting with None, means the instance could not
+    be resolved; the reason has already been logged.
+    :param describe: Formats the message for an instance name and its result.
+    """
+    failed = False
+    for name, (result, error) in zip(names, outcomes):
+        if error is not None:
+            typer.echo(f"Failed to {action} instance {name}: {error}", err=True)
+            failed = True
+        elif result is None or (isinstance(result, tuple) and result[0] is None):
+            typer.echo(f"Failed to {action} instance {name}: it could not be resolved", err=True)
+            failed = True
+        else:
+            typer.echo(describe(name, result))
+    if failed:
+        raise typer.Exit(code=1)
+
 
 @app.command()
 def start(instance_name: str = typer.Option(
         "devbox",
         "--instance-name",
         "-i",
-        help="Name of the EC2 instance to start. If not specified, the default instance will be used.",
+        help="Name of the EC2 instance to start, or a comma-separated list of names. If not specified, the default instance will be used.",
         envvar="EC2_INSTANCE_NAME",
         show_default=True)) -> str:
     """Starts your dev box"""
-    # First get my local IP address
-    ip = get('https://api.ipify.org').content.decode('utf8')
-    # Then start my EC2 instance
-    id, public_ip = ec2.start_instance(instance_name, ip)
-    typer.echo(f"Started instance {instance_name} ({id}) at {public_ip}")
+    from devbox import ec2
+
+    names = _split_names(instance_name)
+    # Get my local IP address while looking up the EC2 instances
+    with ThreadPoolExecutor(max_workers=len(names) + 1) as executor:
+        ip_future = executor.submit(_my_public_ip)
+        instances = list(executor.map(ec2.describe_instance_by_name, names))
+        ip = ip_future.result()
+    # Then start my EC2 instances
+    outcomes = _map_concurrently(lambda instance: ec2.start_instance(instance, ip), instances)
+    _echo_outcomes(names, outcomes, "start",
+                   lambda name, result: f"Started instance {name} ({result[0]}) at {result[1]}")
 
 @app.command()
 def stop(instance_name: str = typer.Option(
         "devbox",
         "--instance-name",
         "-i",
-        help="Name of the EC2 instance to stop. If not specified, the default instance will be used.",
+        help="Name of the EC2 instance to stop, or a comma-separated list of names. If not specified, the default instance will be used.",
         envvar="EC2_INSTANCE_NAME",
         show_default=True)):
     """Stops your dev box"""
-    id = ec2.stop_instance(instance_name)
-    typer.echo(f"Stopped instance {instance_name} ({id})")
+    from devbox import ec2
+
+    names = _split_names(instance_name)
+    _echo_outcomes(names, _map_concurrently(ec2.stop_instance, names), "stop",
+                   lambda name, id: f"Stopped instance {name} ({id})")
 
 @app.command()
 def status(instance_name: str = typer.Option(
         "devbox",
         "--instance-name",
         "-i",
-        help="Name of the EC2 instance to get. If not specified, the default instance will be used.",
+        help="Name of the EC2 instance to get, or a comma-separated list of names. If not specified, the default instance will be used.",
         envvar="EC2_INSTANCE_NAME",
         show_default=True)):
     """Shows the status of your dev box"""
-    status, ip = ec2.get_instance_status(instance_name)
-    typer.echo(f"Instance {instance_name} is {status} at IP {ip}")
+    from devbox import ec2
+
+    names = _split_names(instance_name)
+    _echo_outcomes(names, _map_concurrently(ec2.get_instance_status, names), "get",
+                   lambda name, result: f"Instance {name} is {result[0]} at IP {result[1]}")
+
+
+@app.command("status-all")
+def status_all(instance_name: str = typer.Option(
+        "devbox",
+        "--instance-name",
+        "-i",
+        help="Comma-separated list of names of the EC2 instances to get. If not specified, the default instance will be used.",
+        envvar="EC2_INSTANCE_NAME",
+        show_default=True)):
+    """Shows the status of several dev boxes with a single lookup"""
+    from devbox import ec2
+
+    names = _split_names(instance_name)
+    statuses = ec2.get_instance_statuses(names)
+    _echo_outcomes(names, [(statuses[name], None) for name in names], "get",
+                   lambda name, result: f"Instance {name} is {result[0]} at IP {result[1]}")
 
 
 @app.command()
@@ -50,12 +186,21 @@ def reboot(instance_name: str = typer.Option(
         "devbox",
         "--instance-name",
         "-i",
-        help="Name of the EC2 instance to restart. If not specified, the default instance will be used.",
+        help="Name of the EC2 instance to restart, or a comma-separated list of names. If not specified, the default instance will be used.",
         envvar="EC2_INSTANCE_NAME",
         show_default=True)):
     """Reboots your dev box"""
-    id = ec2.reboot_instance(instance_name)
-    typer.echo(f"Rebooted instance {instance_name} ({id})")
+    from devbox import ec2
+
+    names = _split_names(instance_name)
+    _echo_outcomes(names, _map_concurrently(ec2.reboot_instance, names), "reboot",
+                   lambda name, id: f"Rebooted instance {name} ({id})")
+
+
+def _configure_logging(verbose: bool = False) -> None:
+    """Shows devbox progress messages, and debug messages when `verbose`."""
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger(__app_name__).setLevel(logging.DEBUG if verbose else logging.INFO)
 
 
 def _version_callback(value: bool) -> None:
@@ -70,8 +215,12 @@ def main(version: Optional[bool] = typer.Option(
         "-v",
         help="Show the application's version and exit.",
         callback=_version_callback,
-        is_eager=True)) -> None:
+        is_eager=True),
+        verbose: bool = typer.Option(
+        False,
+        "--verbose",
+        help="Show debug messages.")) -> None:
     """
     Welcome to the devbox CLI!
     """
-    pass
+    _configure_logging(verbose)
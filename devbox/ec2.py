@@ -1,124 +1,319 @@
-import boto3
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
-from botocore.exceptions import ClientError
+import sys
+import threading
+import time
+from devbox import _awsmini, cache
 from devbox.retry import retry
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-logging.basicConfig(level=logging.INFO)
 
+# Concurrent first calls must share one client, so the check and the
+# construction both happen under the lock.
+_ec2_client = None
+_ec2_client_lock = threading.Lock()
 
-def get_ec2_resource():
+
+def _build_ec2_client():
     """
-    :return: A Boto3 Amazon EC2 resource. This high-level resource
-             is used to create additional high-level objects
-             that wrap low-level Amazon EC2 service actions.
+    :return: An Amazon EC2 client. The built-in minimal client is used when
+             static credentials and a region are configured, which avoids
+             importing boto3. Otherwise a Boto3 client is used, which supports
+             every credential source (instance roles, SSO, assumed roles...).
     """
-    return boto3.resource("ec2")
+    client = _awsmini.Client.from_environment()
+    if client is not None:
+        return client
+    try:
+        import boto3
+    except ImportError:
+        raise RuntimeError(
+            "No static AWS credentials and region found. Configure them or "
+            "install boto3 to use other credential sources."
+        ) from None
+    return boto3.client("ec2")
 
 
-def get_ec2_instance_resource(instance_id):
+def get_ec2_client():
     """
-    :param boto3_resource: A Boto3 Amazon EC2 resource.
-    :param instance_id: The ID of the instance to retrieve.
-    :return: The instance object.
+    :return: The Amazon EC2 client, built once and shared for the process.
     """
-    boto3_resource = get_ec2_resource()
+    global _ec2_client
+    if _ec2_client is None:
+        with _ec2_client_lock:
+            if _ec2_client is None:
+                _ec2_client = _build_ec2_client()
+    return _ec2_client
 
-    try:
-        resource = boto3_resource.Instance(instance_id)
-    except ClientError as e:
-        logger.error(f"Error getting EC2 instance resource: {str(e)}")
+
+def _client_errors():
+    """
+    :return: The exception types raised for EC2 API error responses. botocore's
+             is only included once boto3 has been loaded.
+    """
+    botocore_exceptions = sys.modules.get("botocore.exceptions")
+    if botocore_exceptions is None:
+        return (_awsmini.ClientError,)
+    return (_awsmini.ClientError, botocore_exceptions.ClientError)
+
+
+@retry(report=logger.info)
+def _ec2_call(operation, **kwargs):
+    """
+    Calls a bound EC2 client operation, retrying throttling and transient
+    API errors.
+    """
+    return operation(**kwargs)
+
+
+@retry(report=logger.info)
+def _describe_reservations(ec2, pagination_config, **kwargs):
+    """
+    :param ec2: The EC2 client.
+    :return: The reservations of every describe_instances page, retrying
+             throttling and transient API errors.
+    """
+    pages = ec2.get_paginator("describe_instances").paginate(
+        PaginationConfig=pagination_config, **kwargs
+    )
+    return [reservation for page in pages for reservation in page["Reservations"]]
+
+
+# Terminated instances keep their Name tag for a while but are no longer devboxes.
+LIVE_INSTANCE_STATES = ["pending", "running", "shutting-down", "stopping", "stopped"]
+
+
+def _name_filters(instance_names):
+    """
+    :return: describe_instances filters for the live instances named `instance_names`.
+    """
+    return [
+        {"Name": "tag:Name", "Values": list(instance_names)},
+        {"Name": "instance-state-name", "Values": LIVE_INSTANCE_STATES},
+    ]
+
+
+def _is_named(instance, instance_name):
+    """
+    :return: Whether `instance` counts as the instance named `instance_name`.
+    """
+    tags = {tag["Key"]: tag["Value"] for tag in instance.get("Tags", [])}
+    return tags.get("Name") == instance_name and instance["State"]["Name"] in LIVE_INSTANCE_STATES
+
+
+def _instances_named(reservations, instance_name):
+    """
+    :return: The instances in `reservations` that count as `instance_name`.
+    """
+    return [
+        instance
+        for reservation in reservations
+        for instance in reservation["Instances"]
+        if _is_named(instance, instance_name)
+    ]
+
+
+def _single_instance_named(reservations, instance_name):
+    """
+    :return: The only instance in `reservations` named `instance_name`, or
+             None (with the reason logged) if there is none or several.
+    """
+    instances = _instances_named(reservations, instance_name)
+    if instances == []:
+        logger.error(f"No EC2 instance found by name: {instance_name}")
         return None
-    except ValueError as ve:
-        if "Required parameter" in str(ve):
-            logger.error(f"No instance ID was found for the lookup operation")
-            return None
-    return resource
+    if len(instances) > 1:
+        logger.error(f"Multiple EC2 instances found by name: {instance_name}")
+        return None
+    return instances[0]
 
 
-def get_ec2_client():
+def _instance_status(instance):
     """
-    :return: A Boto3 Amazon EC2 client. This low-level client
-             is used to make low-level Amazon EC2 service calls.
+    :param instance: The instance description dictionary, or None.
+    :return: The (status, public IP) of the instance.
     """
-    return boto3.client("ec2")
+    if instance is None:
+        return None, None
+    state = instance["State"]["Name"]
+    if state == "stopped":
+        return "stopped", "0.0.0.0"
+    return state, instance.get("PublicIpAddress", "0.0.0.0")
 
 
-def get_ec2_instance_id_by_name(instance_name):
+INSTANCE_IDS_CACHE = "ids.json"
+_instance_ids_lock = threading.Lock()
+
+
+def _describe_cached_instance(ec2, instance_name):
+    """
+    Returns the EC2 instance description dictionary for the instance ID
+    cached under `instance_name`, or None if it is unknown or stale.
+    A stale entry is dropped so the caller falls back to the Name tag lookup.
     """
-    Returns an EC2 dictionary by Name tag
+    instance_id = cache.read_json(INSTANCE_IDS_CACHE).get(instance_name)
+    if instance_id is None:
+        return None
+    try:
+        response = _ec2_call(ec2.describe_instances, InstanceIds=[instance_id])
+        instance = response["Reservations"][0]["Instances"][0]
+    except _client_errors() + (IndexError,) as err:
+        logger.info(f"Ignoring cached EC2 instance {instance_id}: {str(err)}")
+        _forget_instance_id(instance_name)
+        return None
+    if not _is_named(instance, instance_name):
+        _forget_instance_id(instance_name)
+        return None
+    return instance
+
+
+def _cache_instance_id(instance_name, instance_id):
+    """Remembers the instance ID of `instance_name` for later lookups."""
+    with _instance_ids_lock:
+        ids = cache.read_json(INSTANCE_IDS_CACHE)
+        if ids.get(instance_name) != instance_id:
+            ids[instance_name] = instance_id
+            cache.write_json(INSTANCE_IDS_CACHE, ids)
+
+
+def _forget_instance_id(instance_name):
+    """Drops the cached instance ID of `instance_name`."""
+    with _instance_ids_lock:
+        ids = cache.read_json(INSTANCE_IDS_CACHE)
+        if ids.pop(instance_name, None) is not None:
+            cache.write_json(INSTANCE_IDS_CACHE, ids)
+
+
+def describe_instance_by_name(instance_name):
     """
+    Returns the EC2 instance description dictionary by Name tag
+    """
+    # Resolved outside the try so configuration errors reach the caller
     ec2 = get_ec2_client()
     try:
-        response = ec2.describe_instances(
-            Filters=[{"Name": "tag:Name", "Values": [instance_name]}]
+        instance = _describe_cached_instance(ec2, instance_name)
+        if instance is not None:
+            return instance
+        # EC2's default page size answers in one call; a second match is
+        # already an error, so stop paging as soon as one is seen
+        reservations = _describe_reservations(
+            ec2, {"MaxItems": 2}, Filters=_name_filters([instance_name])
         )
     except Exception as e:
         logger.error(f"Error getting EC2 instance by name: {instance_name}: {str(e)}")
         return None
-    if response["Reservations"] == []:
-        logger.error(f"No EC2 instance found by name: {instance_name}")
+    instance = _single_instance_named(reservations, instance_name)
+    if instance is None:
         return None
-    if len(response["Reservations"]) > 1:
-        logger.error(f"Multiple EC2 instances found by name: {instance_name}")
+    _cache_instance_id(instance_name, instance["InstanceId"])
+    return instance
+
+
+def get_ec2_instance_id_by_name(instance_name):
+    """
+    Returns an EC2 instance ID by Name tag
+    """
+    instance = describe_instance_by_name(instance_name)
+    if instance is None:
         return None
-    return response["Reservations"][0]["Instances"][0]["InstanceId"]
+    return instance["InstanceId"]
 
 
-def get_security_group(id: str):
+def _wait_for_state(
+    instance_id: str,
+    state: str,
+    interval: float = 2,
+    max_wait: float = 300,
+):
     """
-    :param id: The ID of the security group to retrieve.
-    :return: The security group object.
+    Polls the instance until it reaches `state`, backing off gently from
+    `interval` seconds.
+    :return: The instance description dictionary.
     """
-    return get_ec2_resource().SecurityGroup(id)
+    ec2 = get_ec2_client()
+    deadline = time.monotonic() + max_wait
+    delay = interval
+    while True:
+        response = _ec2_call(ec2.describe_instances, InstanceIds=[instance_id])
+        instance = response["Reservations"][0]["Instances"][0]
+        if instance["State"]["Name"] == state:
+            return instance
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(
+                f"EC2 Instance {instance_id} did not reach state {state} "
+                f"within {max_wait}s"
+            )
+        time.sleep(delay)
+        delay = min(delay * 1.5, 5)
 
 
-@retry(report=logger.info)
-def get_instance_public_ip(instance_resource):
+def _get_instance_security_group(instance):
     """
-    :param instance_resource: The instance object.
-    :return: The public IP address of the instance.
+    :param instance: The instance description dictionary.
+    :return: The security group description dictionary of the instance.
     """
-    ip = instance_resource.public_ip_address
-    if ip is None:
-        raise Exception("No public IP address found")
-    return ip
+    group_id = instance["SecurityGroups"][0]["GroupId"]
+    logger.info(f"Getting Security Group by ID: {group_id}...")
+    response = _ec2_call(get_ec2_client().describe_security_groups, GroupIds=[group_id])
+    return response["SecurityGroups"][0]
 
 
-def start_instance(instance_name: str, my_ip: str):
-    """Starts dev box and authorize ingress on port 22 for the `my_ip`."""
-    logger.info(f"1. Getting EC2 Instance by name {instance_name}...")
-    instance_id = get_ec2_instance_id_by_name(instance_name)
-    instance = get_ec2_instance_resource(instance_id)
+INGRESS_IPS_CACHE = "ingress.json"
+_ingress_ips_lock = threading.Lock()
+
+
+def _cache_ingress_ip(instance_id, ingress_ip):
+    """Remembers the IP last authorized for SSH ingress to `instance_id`."""
+    with _ingress_ips_lock:
+        ips = cache.read_json(INGRESS_IPS_CACHE)
+        if ips.get(instance_id) != ingress_ip:
+            ips[instance_id] = ingress_ip
+            cache.write_json(INGRESS_IPS_CACHE, ips)
+
+
+def start_instance(instance, my_ip: str):
+    """
+    Starts dev box and authorize ingress on port 22 for the `my_ip`.
+    :param instance: The instance description dictionary.
+    :return: The instance ID and its public IP address, which is None for
+             instances without one (e.g. reached over a VPN).
+    """
     if instance is None:
+        logger.error("No instance was found for the start operation")
         return None, None
-    logger.info(f"2. Starting EC2 Instance: {instance_id}...")
-    instance.start()
-    logger.info(f"3. Waiting for EC2 Instance to start: {instance_id}...")
-    instance.wait_until_running()
-    logger.info(
-        f"4. Getting Security Group by ID: {instance.security_groups[0]['GroupId']}..."
-    )
-    security_group = get_security_group(instance.security_groups[0]["GroupId"])
-    logger.info(f"5. Authorizing ingress on port 22 for IP: {my_ip}...")
+    instance_id = instance["InstanceId"]
+    if instance["State"]["Name"] == "running":
+        if cache.read_json(INGRESS_IPS_CACHE).get(instance_id) == my_ip:
+            logger.info(f"EC2 Instance {instance_id} is already running for IP: {my_ip}")
+            return instance_id, instance.get("PublicIpAddress")
+        logger.info(f"1. EC2 Instance is already running: {instance_id}")
+        security_group = _get_instance_security_group(instance)
+    else:
+        logger.info(f"1. Starting EC2 Instance: {instance_id}...")
+        _ec2_call(get_ec2_client().start_instances, InstanceIds=[instance_id])
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # Fetch the security group while the instance boots
+            security_group_future = executor.submit(_get_instance_security_group, instance)
+            logger.info(f"2. Waiting for EC2 Instance to start: {instance_id}...")
+            instance = _wait_for_state(instance_id, "running")
+            security_group = security_group_future.result()
+    logger.info(f"3. Authorizing ingress on port 22 for IP: {my_ip}...")
     authorize_ingress(security_group, my_ip)
-    public_ip = get_instance_public_ip(instance)
-    return instance_id, public_ip
+    _cache_ingress_ip(instance_id, my_ip)
+    return instance_id, instance.get("PublicIpAddress")
 
 
 def stop_instance(instance_name: str):
     """Stops dev box."""
     logger.info(f"1. Getting EC2 Instance by name {instance_name}...")
     instance_id = get_ec2_instance_id_by_name(instance_name)
-    instance = get_ec2_instance_resource(instance_id)
-    if instance is None:
+    if instance_id is None:
         return None
     logger.info(f"2. Stopping EC2 Instance: {instance_id}...")
-    instance.stop()
+    _ec2_call(get_ec2_client().stop_instances, InstanceIds=[instance_id])
     logger.info(f"3. Waiting for EC2 Instance to stop: {instance_id}...")
-    instance.wait_until_stopped()
+    _wait_for_state(instance_id, "stopped")
     return instance_id
 
 
@@ -127,36 +322,61 @@ def get_instance_status(instance_name: str):
     :param instance_name: The name of the instance to retrieve.
     :return: The status of the instance.
     """
-    instance_id = get_ec2_instance_id_by_name(instance_name)
-    instance = get_ec2_instance_resource(instance_id)
-    if instance is None:
-        return None, None
-    if instance.state["Name"] == "stopped":
-        return "stopped", "0.0.0.0"
-    public_ip = get_instance_public_ip(instance)
-    return instance.state["Name"], public_ip
+    return _instance_status(describe_instance_by_name(instance_name))
+
+
+def get_instance_statuses(instance_names):
+    """
+    :param instance_names: The names of the instances to retrieve.
+    :return: A dictionary of instance name to (status, public IP), fetched
+             with a single paginated describe_instances request.
+    """
+    # Resolved outside the try so configuration errors reach the caller
+    ec2 = get_ec2_client()
+    try:
+        reservations = _describe_reservations(
+            ec2, {"PageSize": 100}, Filters=_name_filters(instance_names)
+        )
+    except Exception as e:
+        logger.error(f"Error getting EC2 instances by name: {instance_names}: {str(e)}")
+        return {name: (None, None) for name in instance_names}
+    return {
+        name: _instance_status(_single_instance_named(reservations, name))
+        for name in instance_names
+    }
 
 
 def reboot_instance(instance_name: str):
     """Reboots dev box."""
     logger.info(f"1. Getting EC2 Instance by name {instance_name}...")
     instance_id = get_ec2_instance_id_by_name(instance_name)
-    instance = get_ec2_instance_resource(instance_id)
-    if instance is None:
+    if instance_id is None:
         return None
     logger.info(f"2. Rebooting EC2 Instance: {instance_id}")
-    instance.reboot()
+    _ec2_call(get_ec2_client().reboot_instances, InstanceIds=[instance_id])
     return instance_id
 
 
 def authorize_ingress(security_group, ssh_ingress_ip: str):
     """
     Adds a rule to the security group to allow access to SSH.
+    :param security_group: The security group description dictionary.
     """
     if security_group is None:
         logger.info("No security group to update.")
         return
 
+    cidr_ip = f"{ssh_ingress_ip}/32"
+    for permission in security_group.get("IpPermissions", []):
+        if (
+            permission.get("IpProtocol") == "tcp"
+            and permission.get("FromPort") == 22
+            and permission.get("ToPort") == 22
+            and any(r.get("CidrIp") == cidr_ip for r in permission.get("IpRanges", []))
+        ):
+            logger.info("Inbound rules already exist. Nothing to do.")
+            return None
+
     try:
         ip_permissions = [
             {
@@ -164,18 +384,21 @@ def authorize_ingress(security_group, ssh_ingress_ip: str):
                 "IpProtocol": "tcp",
                 "FromPort": 22,
                 "ToPort": 22,
-                "IpRanges": [{"CidrIp": f"{ssh_ingress_ip}/32"}],
+                "IpRanges": [{"CidrIp": cidr_ip}],
             }
         ]
-        response = security_group.authorize_ingress(IpPermissions=ip_permissions)
-    except ClientError as err:
+        response = _ec2_call(
+            get_ec2_client().authorize_security_group_ingress,
+            GroupId=security_group["GroupId"], IpPermissions=ip_permissions
+        )
+    except _client_errors() as err:
 
         if err.response["Error"]["Code"] == "InvalidPermission.Duplicate":
             logger.info("Inbound rules already exist. Nothing to do.")
             return None
         logger.error(
             "Couldn't authorize inbound rules for %s. Here's why: %s: %s",
-            security_group.id,
+            security_group["GroupId"],
             err.response["Error"]["Code"],
             err.response["Error"]["Message"],
         )
@@ -1,28 +1,73 @@
 #
 """Retry Logic Decorator"""
-#from __future__ import print_function
-import itertools
+import random
+import sys
 import time
 
-def retry(delays=(0, 1, 2, 4, 8, 16),
-          exception=Exception,
+THROTTLING_CODES = (
+    "RequestLimitExceeded",
+    "Throttling",
+    "ThrottlingException",
+    "TooManyRequestsException",
+)
+TRANSIENT_CODES = (
+    "InternalError",
+    "InternalFailure",
+    "RequestTimeout",
+    "ServiceUnavailable",
+    "Unavailable",
+)
+
+
+def _error_code(problem):
+    """Returns the AWS error code of a ClientError, if any."""
+    response = getattr(problem, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code")
+    return None
+
+
+def retry(deadline=30,
+          base=0.2,
+          cap=4.0,
+          exceptions=None,
           report=lambda *args: None):
-    """Retry decorator"""
+    """
+    Retry decorator using full-jitter exponential backoff, giving up once
+    `deadline` seconds have passed. `exceptions` defaults to the AWS client
+    ClientError types and RuntimeError. A ClientError is only retried when its
+    code is a throttling or transient one, and throttling backs off longer.
+    """
     def wrapper(function):
         def wrapped(*args, **kwargs):
+            retryable = exceptions
+            if retryable is None:
+                from devbox._awsmini import ClientError
+                retryable = (ClientError, RuntimeError)
+                botocore_exceptions = sys.modules.get("botocore.exceptions")
+                if botocore_exceptions is not None:
+                    retryable += (botocore_exceptions.ClientError,)
             problems = []
-            for delay in itertools.chain(delays, [ None ]):
+            start = time.monotonic()
+            attempt = 0
+            while True:
                 try:
                     return function(*args, **kwargs)
-                except exception as problem:
-                    if hasattr(problem, "code") and problem.code == 403:
+                except retryable as problem:
+                    code = _error_code(problem)
+                    if code is not None and code not in THROTTLING_CODES + TRANSIENT_CODES:
                         raise
                     problems.append(problem)
-                    if delay is None:
+                    ceiling = min(cap, base * 2 ** attempt)
+                    if code in THROTTLING_CODES:
+                        delay = random.uniform(ceiling, cap)
+                    else:
+                        delay = random.uniform(0, ceiling)
+                    attempt += 1
+                    if time.monotonic() + delay > start + deadline:
                         report("retry failed definitely: {}".format(problems))
                         raise
-                    else:
-                        report("retry failed: {} -- delaying for {}s".format(problem, delay))
-                        time.sleep(delay)
+                    report("retry failed: {} -- delaying for {:.2f}s".format(problem, delay))
+                    time.sleep(delay)
         return wrapped
     return wrapper
@@ -0,0 +1,182 @@
+import datetime
+import io
+import unittest
+import urllib.error
+import xml.etree.ElementTree as ElementTree
+from unittest import mock
+
+from devbox import _awsmini
+
+NS = 'xmlns="http://ec2.amazonaws.com/doc/2016-11-15/"'
+
+
+def parse(xml):
+    return _awsmini._strip_namespaces(ElementTree.fromstring(xml))
+
+
+class SigV4SignTest(unittest.TestCase):
+    # Known-answer examples from the AWS Signature Version 4 documentation.
+    ACCESS_KEY = "AKIDEXAMPLE"
+    SECRET_KEY = "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY"
+    NOW = datetime.datetime(2015, 8, 30, 12, 36, 0)
+
+    def test_get_vanilla(self):
+        headers = _awsmini.sigv4_sign(
+            "GET", "https://example.amazonaws.com/", {}, b"", "us-east-1",
+            self.ACCESS_KEY, self.SECRET_KEY, service="service", now=self.NOW)
+        self.assertEqual(
+            headers["Authorization"],
+            "AWS4-HMAC-SHA256 Credential=AKIDEXAMPLE/20150830/us-east-1/service/aws4_request, "
+            "SignedHeaders=host;x-amz-date, "
+            "Signature=5fa00fa31553b73ebf1942676e86291e8372ff2a2260956d9b8aae1d763fbf31")
+
+    def test_iam_list_users(self):
+        headers = _awsmini.sigv4_sign(
+            "GET", "https://iam.amazonaws.com/?Action=ListUsers&Version=2010-05-08",
+            {"Content-Type": "application/x-www-form-urlencoded; charset=utf-8"},
+            b"", "us-east-1", self.ACCESS_KEY, self.SECRET_KEY, service="iam", now=self.NOW)
+        self.assertEqual(headers["X-Amz-Date"], "20150830T123600Z")
+        self.assertEqual(
+            headers["Authorization"],
+            "AWS4-HMAC-SHA256 Credential=AKIDEXAMPLE/20150830/us-east-1/iam/aws4_request, "
+            "SignedHeaders=content-type;host;x-amz-date, "
+            "Signature=5d672d79c15b13162d9279b0855cfba6789a8edb4c82c400e06b5924a6f2b5d7")
+
+    def test_session_token_is_signed(self):
+        headers = _awsmini.sigv4_sign(
+            "POST", "https://ec2.us-east-1.amazonaws.com/", {}, b"", "us-east-1",
+            self.ACCESS_KEY, self.SECRET_KEY, session_token="token", now=self.NOW)
+        self.assertEqual(headers["X-Amz-Security-Token"], "token")
+        self.assertIn("SignedHeaders=host;x-amz-date;x-amz-security-token", headers["Authorization"])
+
+
+class FlattenTest(unittest.TestCase):
+    def test_ip_permissions(self):
+        params = {}
+        _awsmini._flatten(params, "", {
+            "GroupId": "sg-1",
+            "IpPermissions": [{
+                "IpProtocol": "tcp",
+                "FromPort": 22,
+                "ToPort": 22,
+                "IpRanges": [{"CidrIp": "1.2.3.4/32"}],
+            }],
+        })
+        self.assertEqual(params, {
+            "GroupId": "sg-1",
+            "IpPermissions.1.IpProtocol": "tcp",
+            "IpPermissions.1.FromPort": "22",
+            "IpPermissions.1.ToPort": "22",
+            "IpPermissions.1.IpRanges.1.CidrIp": "1.2.3.4/32",
+        })
+
+    def test_filters_use_value_n(self):
+        client = _awsmini.Client("key", "secret", "us-east-1")
+        calls = []
+        client.call = lambda action, params: calls.append((action, params)) or parse(
+            f"<DescribeInstancesResponse {NS}><reservationSet/></DescribeInstancesResponse>")
+        client.describe_instances(Filters=[{"Name": "tag:Name", "Values": ["a", "b"]}])
+        action, request = calls[0]
+        params = {}
+        _awsmini._flatten(params, "", request)
+        self.assertEqual(action, "DescribeInstances")
+        self.assertEqual(params, {
+            "Filter.1.Name": "tag:Name",
+            "Filter.1.Value.1": "a",
+            "Filter.1.Value.2": "b",
+        })
+
+
+class ParseTest(unittest.TestCase):
+    def test_describe_instances(self):
+        root = parse(f"""
+            <DescribeInstancesResponse {NS}>
+              <requestId>r</requestId>
+              <reservationSet><item>
+                <reservationId>r-1</reservationId>
+                <instancesSet><item>
+                  <instanceId>i-1</instanceId>
+                  <instanceState><code>16</code><name>running</name></instanceState>
+                  <ipAddress>1.2.3.4</ipAddress>
+                  <groupSet><item><groupId>sg-1</groupId><groupName>ssh</groupName></item></groupSet>
+                  <tagSet><item><key>Name</key><value>devbox</value></item></tagSet>
+                </item></instancesSet>
+              </item></reservationSet>
+              <nextToken>token</nextToken>
+            </DescribeInstancesResponse>""")
+        self.assertEqual(_awsmini._parse_describe_instances(root), {
+            "Reservations": [{
+                "ReservationId": "r-1",
+                "Instances": [{
+                    "InstanceId": "i-1",
+                    "State": {"Code": 16, "Name": "running"},
+                    "PublicIpAddress": "1.2.3.4",
+                    "SecurityGroups": [{"GroupId": "sg-1", "GroupName": "ssh"}],
+                    "Tags": [{"Key": "Name", "Value": "devbox"}],
+                }],
+            }],
+            "NextToken": "token",
+        })
+
+    def test_describe_instances_stopped_without_ip(self):
+        root = parse(f"""
+            <DescribeInstancesResponse {NS}><reservationSet><item><instancesSet><item>
+              <instanceId>i-1</instanceId>
+              <instanceState><code>80</code><name>stopped</name></instanceState>
+            </item></instancesSet></item></reservationSet></DescribeInstancesResponse>""")
+        instance = _awsmini._parse_describe_instances(root)["Reservations"][0]["Instances"][0]
+        self.assertEqual(instance["State"]["Name"], "stopped")
+        self.assertNotIn("PublicIpAddress", instance)
+
+    def test_describe_security_groups(self):
+        root = parse(f"""
+            <DescribeSecurityGroupsResponse {NS}><securityGroupInfo><item>
+              <groupId>sg-1</groupId>
+              <groupName>ssh</groupName>
+              <ipPermissions><item>
+                <ipProtocol>tcp</ipProtocol>
+                <fromPort>22</fromPort>
+                <toPort>22</toPort>
+                <groups/>
+                <ipRanges><item><cidrIp>1.2.3.4/32</cidrIp></item></ipRanges>
+              </item></ipPermissions>
+            </item></securityGroupInfo></DescribeSecurityGroupsResponse>""")
+        self.assertEqual(_awsmini._parse_describe_security_groups(root), {
+            "SecurityGroups": [{
+                "GroupId": "sg-1",
+                "GroupName": "ssh",
+                "IpPermissions": [{
+                    "IpProtocol": "tcp",
+                    "FromPort": 22,
+                    "ToPort": 22,
+                    "IpRanges": [{"CidrIp": "1.2.3.4/32"}],
+                }],
+            }],
+        })
+
+    def test_error_response(self):
+        payload = (b"<Response><Errors><Error><Code>InvalidInstanceID.NotFound</Code>"
+                   b"<Message>The instance ID 'i-1' does not exist</Message></Error></Errors>"
+                   b"<RequestID>r</RequestID></Response>")
+        error = urllib.error.HTTPError(
+            "https://ec2.us-east-1.amazonaws.com/", 400, "Bad Request", {}, io.BytesIO(payload))
+        client = _awsmini.Client("key", "secret", "us-east-1")
+        with mock.patch("urllib.request.urlopen", side_effect=error):
+            with self.assertRaises(_awsmini.ClientError) as raised:
+                client.describe_instances(InstanceIds=["i-1"])
+        self.assertEqual(raised.exception.response["Error"], {
+            "Code": "InvalidInstanceID.NotFound",
+            "Message": "The instance ID 'i-1' does not exist",
+        })
+        self.assertEqual(raised.exception.operation_name, "DescribeInstances")
+
+
+class PaginatorTest(unittest.TestCase):
+    def test_unsupported_operation(self):
+        client = _awsmini.Client("key", "secret", "us-east-1")
+        with self.assertRaises(ValueError):
+            client.get_paginator("describe_security_groups")
+
+
+if __name__ == "__main__":
+    unittest.main()
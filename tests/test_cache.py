@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from devbox import cache
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = os.path.join(directory.name, "devbox")
+        patcher = mock.patch.object(cache, "cache_dir", return_value=self.dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_round_trip(self):
+        cache.write_json("ids.json", {"devbox": "i-1"})
+        self.assertEqual(cache.read_json("ids.json"), {"devbox": "i-1"})
+
+    def test_missing_file_reads_empty(self):
+        self.assertEqual(cache.read_json("ids.json"), {})
+
+    def test_truncated_file_reads_empty(self):
+        os.makedirs(self.dir)
+        with open(cache.cache_path("ids.json"), "w") as f:
+            f.write('{"devbox": "i-')
+        self.assertEqual(cache.read_json("ids.json"), {})
+
+    def test_non_dict_reads_empty(self):
+        os.makedirs(self.dir)
+        with open(cache.cache_path("ids.json"), "w") as f:
+            json.dump(["i-1"], f)
+        self.assertEqual(cache.read_json("ids.json"), {})
+
+    def test_write_replaces_atomically(self):
+        cache.write_json("ids.json", {"devbox": "i-1"})
+        with mock.patch.object(cache.os, "replace", wraps=os.replace) as replace:
+            cache.write_json("ids.json", {"devbox": "i-2"})
+        tmp, path = replace.call_args[0]
+        self.assertEqual(path, cache.cache_path("ids.json"))
+        self.assertTrue(tmp.startswith(path + ".tmp."))
+        self.assertEqual(os.listdir(self.dir), ["ids.json"])
+        self.assertEqual(cache.read_json("ids.json"), {"devbox": "i-2"})
+
+    def test_failed_write_keeps_old_file_and_removes_temp(self):
+        cache.write_json("ids.json", {"devbox": "i-1"})
+        with mock.patch.object(cache.os, "replace", side_effect=OSError("disk full")):
+            cache.write_json("ids.json", {"devbox": "i-2"})
+        self.assertEqual(os.listdir(self.dir), ["ids.json"])
+        self.assertEqual(cache.read_json("ids.json"), {"devbox": "i-1"})
+
+
+if __name__ == "__main__":
+    unittest.main()
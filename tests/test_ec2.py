@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from devbox import cache, ec2
+
+
+def instance(state, public_ip="1.2.3.4"):
+    description = {
+        "InstanceId": "i-1",
+        "State": {"Name": state},
+        "SecurityGroups": [{"GroupId": "sg-1"}],
+        "Tags": [{"Key": "Name", "Value": "devbox"}],
+    }
+    if public_ip:
+        description["PublicIpAddress"] = public_ip
+    return description
+
+
+class StartInstanceTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.client = mock.Mock()
+        self.client.describe_security_groups.return_value = {
+            "SecurityGroups": [{"GroupId": "sg-1", "IpPermissions": []}]
+        }
+        self.client.authorize_security_group_ingress.return_value = {"Return": True}
+        for patcher in (
+            mock.patch.object(cache, "cache_dir", return_value=os.path.join(directory.name, "devbox")),
+            mock.patch.object(ec2, "get_ec2_client", return_value=self.client),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_already_running_for_same_ip_makes_no_calls(self):
+        cache.write_json(ec2.INGRESS_IPS_CACHE, {"i-1": "5.6.7.8"})
+        self.assertEqual(ec2.start_instance(instance("running"), "5.6.7.8"), ("i-1", "1.2.3.4"))
+        self.assertEqual(self.client.mock_calls, [])
+
+    def test_already_running_for_new_ip_only_authorizes(self):
+        cache.write_json(ec2.INGRESS_IPS_CACHE, {"i-1": "5.6.7.8"})
+        self.assertEqual(ec2.start_instance(instance("running"), "9.9.9.9"), ("i-1", "1.2.3.4"))
+        self.client.start_instances.assert_not_called()
+        self.client.authorize_security_group_ingress.assert_called_once()
+        self.assertEqual(cache.read_json(ec2.INGRESS_IPS_CACHE), {"i-1": "9.9.9.9"})
+
+    def test_stopped_instance_is_started(self):
+        self.client.describe_instances.return_value = {
+            "Reservations": [{"Instances": [instance("running")]}]
+        }
+        self.assertEqual(ec2.start_instance(instance("stopped", None), "5.6.7.8"), ("i-1", "1.2.3.4"))
+        self.client.start_instances.assert_called_once_with(InstanceIds=["i-1"])
+        self.client.authorize_security_group_ingress.assert_called_once()
+        self.assertEqual(cache.read_json(ec2.INGRESS_IPS_CACHE), {"i-1": "5.6.7.8"})
+
+    def test_instance_without_public_ip(self):
+        self.client.describe_instances.return_value = {
+            "Reservations": [{"Instances": [instance("running", None)]}]
+        }
+        self.assertEqual(ec2.start_instance(instance("stopped", None), "5.6.7.8"), ("i-1", None))
+        self.client.authorize_security_group_ingress.assert_called_once()
+
+    def test_unknown_instance(self):
+        self.assertEqual(ec2.start_instance(None, "5.6.7.8"), (None, None))
+        self.assertEqual(self.client.mock_calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
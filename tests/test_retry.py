@@ -0,0 +1,106 @@
+import unittest
+from unittest import mock
+
+from devbox import _awsmini, ec2, retry
+
+
+class FakeClock:
+    """Stands in for time.monotonic/time.sleep so retries run instantly."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+class FakeClockTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.multiple(
+            retry.time, monotonic=self.clock.monotonic, sleep=self.clock.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class RetryTest(FakeClockTestCase):
+    def failing(self, *errors, result="ok"):
+        """Returns a function raising `errors` in turn, then returning `result`."""
+        return mock.Mock(side_effect=list(errors) + [result])
+
+    def test_returns_without_retrying(self):
+        function = self.failing()
+        self.assertEqual(retry.retry()(function)(), "ok")
+        self.assertEqual(function.call_count, 1)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_duplicate_permission_is_not_retried(self):
+        error = _awsmini.ClientError(
+            "InvalidPermission.Duplicate", "exists", "AuthorizeSecurityGroupIngress")
+        function = self.failing(error)
+        with self.assertRaises(_awsmini.ClientError):
+            retry.retry()(function)()
+        self.assertEqual(function.call_count, 1)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_transient_error_is_retried(self):
+        error = _awsmini.ClientError("InternalError", "oops", "DescribeInstances")
+        function = self.failing(error, error)
+        self.assertEqual(retry.retry()(function)(), "ok")
+        self.assertEqual(function.call_count, 3)
+
+    def test_throttling_is_retried_until_the_deadline(self):
+        error = _awsmini.ClientError("RequestLimitExceeded", "slow down", "DescribeInstances")
+        function = mock.Mock(side_effect=error)
+        report = mock.Mock()
+        with self.assertRaises(_awsmini.ClientError):
+            retry.retry(deadline=30, report=report)(function)()
+        self.assertGreater(function.call_count, 2)
+        self.assertLessEqual(self.clock.now, 30)
+        self.assertEqual(function.call_count, len(self.clock.sleeps) + 1)
+        self.assertIn("retry failed definitely", report.call_args[0][0])
+
+    def test_delays_are_jittered_and_capped(self):
+        error = RuntimeError("not yet")
+        function = self.failing(*[error] * 8)
+        with mock.patch.object(retry.random, "uniform", side_effect=lambda low, high: high):
+            retry.retry(base=0.2, cap=1.0)(function)()
+        self.assertEqual(self.clock.sleeps, [0.2, 0.4, 0.8, 1.0, 1.0, 1.0, 1.0, 1.0])
+
+    def test_other_exceptions_are_not_caught(self):
+        function = self.failing(KeyError("missing"))
+        with self.assertRaises(KeyError):
+            retry.retry()(function)()
+        self.assertEqual(function.call_count, 1)
+
+
+class AuthorizeIngressRetryTest(FakeClockTestCase):
+    def test_duplicate_rule_is_a_single_call(self):
+        client = mock.Mock()
+        client.authorize_security_group_ingress.side_effect = _awsmini.ClientError(
+            "InvalidPermission.Duplicate", "exists", "AuthorizeSecurityGroupIngress")
+        with mock.patch.object(ec2, "get_ec2_client", return_value=client):
+            result = ec2.authorize_ingress({"GroupId": "sg-1", "IpPermissions": []}, "1.2.3.4")
+        self.assertIsNone(result)
+        self.assertEqual(client.authorize_security_group_ingress.call_count, 1)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_throttled_rule_is_retried(self):
+        client = mock.Mock()
+        client.authorize_security_group_ingress.side_effect = [
+            _awsmini.ClientError("RequestLimitExceeded", "slow down", "AuthorizeSecurityGroupIngress"),
+            {"Return": True},
+        ]
+        with mock.patch.object(ec2, "get_ec2_client", return_value=client):
+            result = ec2.authorize_ingress({"GroupId": "sg-1", "IpPermissions": []}, "1.2.3.4")
+        self.assertEqual(result, {"Return": True})
+        self.assertEqual(client.authorize_security_group_ingress.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()